@@ -15,21 +15,65 @@ in the checkouts top-level directory.
 from __future__ import unicode_literals, print_function, absolute_import
 
 import argparse
-import glob
+import asyncio
+import hashlib
 import json
 import logging
 import os
 import re
 import shutil
+import socket
+import subprocess
 import sys
+import threading
 import time
 
+from urllib.parse import urlparse
+
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+
 from libvcs.shortcuts import create_repo
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 __version__ = '1.0'
 
 log = logging.getLogger(__name__)
 
+S4EXT_SUFFIX = ".s4ext"
+
+output_lock = threading.Lock()
+
+stats_lock = threading.Lock()
+
+json_encoder = json.JSONEncoder(indent=4)
+
+written_payload_hashes = {}
+
+clone_cache_locks = {}
+
+clone_cache_locks_lock = threading.Lock()
+
+
+def clone_cache_key(metadata):
+    """Return the clone cache key associated with extension ``metadata``."""
+    source = '{scmurl}@{scmrevision}'.format(**metadata)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def clone_cache_lock(cache_key):
+    """Return the lock guarding population of cache entry ``cache_key``."""
+    with clone_cache_locks_lock:
+        return clone_cache_locks.setdefault(cache_key, threading.Lock())
+
 
 def setup_logger(logger=None, level='INFO'):
     """Install logger for CLI use.
@@ -60,6 +104,25 @@ def setup_logger(logger=None, level='INFO'):
         vcslogger.setLevel(level)
 
 
+def setup_git_config():
+    """Inject git configuration into the environment.
+
+    Every git subprocess spawned by libvcs inherits these settings:
+    commit-graph files are written during fetch so later revision walks
+    are fast, and auto-gc and fsmonitor are disabled to avoid per-clone
+    maintenance work while checking out many extensions.
+    """
+    git_config = [
+        ('fetch.writeCommitGraph', 'true'),
+        ('gc.auto', '0'),
+        ('core.fsmonitor', 'false'),
+    ]
+    os.environ['GIT_CONFIG_COUNT'] = str(len(git_config))
+    for index, (key, value) in enumerate(git_config):
+        os.environ['GIT_CONFIG_KEY_%d' % index] = key
+        os.environ['GIT_CONFIG_VALUE_%d' % index] = value
+
+
 def time_call(method):
     """Decorate ``method`` so that it returns its execution time."""
     def wrapper(*wrapper_args, **wrapper_kwargs):
@@ -70,21 +133,31 @@ def time_call(method):
     return wrapper
 
 
+def parse_s4ext_line(line):
+    """Split a metadata line into a key/value tuple.
+
+    :param line: Non-blank, non-comment line of an extension
+        description file.
+    :return: Tuple of metadata key and value (None if the line has
+        no value).
+    """
+    key, sep, value = line.strip().partition(' ')
+    return key, value.strip() if sep else None
+
+
 def parse_s4ext(ext_file_path):
     """Parse a Slicer extension description file.
 
     :param ext_file_path: Path to a Slicer extension description file.
     :return: Dictionnary of extension metadata.
     """
-    ext_metadata = {}
     with open(ext_file_path) as ext_file:
-        for line in ext_file:
-            if not line.strip() or line.startswith("#"):
-                continue
-            fields = [field.strip() for field in line.split(' ', 1)]
-            assert(len(fields) <= 2)
-            ext_metadata[fields[0]] = fields[1] if len(fields) == 2 else None
-    return ext_metadata
+        text = ext_file.read()
+    return dict(
+        parse_s4ext_line(line)
+        for line in text.splitlines()
+        if line.strip() and not line.startswith("#")
+    )
 
 
 def read_dict(json_file_path):
@@ -96,20 +169,591 @@ def read_dict(json_file_path):
     return data
 
 
+def encode_dict(data):
+    """Serialize dictionary to indented json bytes.
+
+    Uses the C-implemented ``orjson`` encoder when available and falls
+    back to the stdlib encoder otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json_encoder.encode(data).encode()
+
+
 def write_dict(json_file_path, data):
-    """Write dictionary to json file."""
-    with open(json_file_path, 'w') as json_file:
-        json_file.write(json.dumps(data, indent=4))
+    """Atomically write dictionary to json file.
+
+    Writes are skipped when ``data`` serializes to the same payload
+    already written to ``json_file_path`` during this run.
+    """
+    payload = encode_dict(data)
+    payload_hash = hash(payload)
+    if written_payload_hashes.get(json_file_path) == payload_hash:
+        return
+    tmp_file_path = json_file_path + '.tmp'
+    with open(tmp_file_path, 'wb') as json_file:
+        json_file.write(payload)
+    os.replace(tmp_file_path, json_file_path)
+    written_payload_hashes[json_file_path] = payload_hash
+
+
+progress_buffers = threading.local()
 
 
 def progress_callback(output, timestamp):
-    """Write ``output`` to ``sys.stdout``."""
-    sys.stdout.write(output)
-    sys.stdout.flush()
+    """Buffer ``output`` and write it to ``sys.stdout`` on newlines.
 
+    Chunks are coalesced per worker thread and flushed once a newline
+    is seen or 4 KiB accumulated, instead of paying a write and flush
+    syscall per chunk handed over by libvcs.
+    """
+    chunks = getattr(progress_buffers, 'chunks', None)
+    if chunks is None:
+        chunks = progress_buffers.chunks = []
+    chunks.append(output)
+    if '\n' not in output and sum(len(chunk) for chunk in chunks) <= 4096:
+        return
+    with output_lock:
+        sys.stdout.write(''.join(chunks))
+        sys.stdout.flush()
+    del chunks[:]
+
+
+def flush_progress_buffer():
+    """Write out any output still buffered for the current thread.
+
+    Called when a checkout completes so trailing output without a
+    newline is not glued onto the next repo serviced by the same pool
+    thread.
+    """
+    chunks = getattr(progress_buffers, 'chunks', None)
+    if not chunks:
+        return
+    with output_lock:
+        sys.stdout.write(''.join(chunks))
+        sys.stdout.flush()
+    del chunks[:]
 
-def main():
-    """Execute command-line tool."""
+
+def warm_dns_cache(metadatas):
+    """Resolve each unique scm host once to warm the resolver cache.
+
+    The handful of forges hosting the extensions would otherwise be
+    re-resolved by every clone/fetch subprocess.
+
+    :param metadatas: Iterable of extension metadata dictionaries.
+    """
+    hosts = {
+        urlparse(metadata['scmurl']).hostname
+        for metadata in metadatas
+    }
+    for host in sorted(hosts - {None}):
+        try:
+            socket.getaddrinfo(host, None)
+        except socket.gaierror:
+            log.warning("Failed to resolve %s" % host)
+
+
+objects_init_lock = threading.Lock()
+
+repo_cache_lock = threading.Lock()
+
+
+def serve_daemon(socket_path, handle_refresh):
+    """Service refresh requests over a unix socket.
+
+    Each connection carries one line: a filter regular expression
+    (``stop`` shuts the daemon down). Matching extensions are refreshed
+    through ``handle_refresh`` and their checkout times streamed back,
+    one ``<name> <duration>`` line per extension.
+
+    :param socket_path: Path of the unix socket to listen on.
+    :param handle_refresh: Callable refreshing extensions matching a
+        filter and returning ``(name, duration)`` tuples.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        server.listen(1)
+        log.info("Listening on %s" % socket_path)
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                request = connection.makefile('r').readline().strip()
+                if request == 'stop':
+                    break
+                results = handle_refresh(request or '.*')
+                payload = ''.join(
+                    '%s %.2f\n' % (name, duration)
+                    for name, duration in results
+                )
+                connection.sendall(payload.encode())
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def request_refresh(socket_path, filter_pattern):
+    """Ask a running daemon to refresh extensions matching a filter.
+
+    :param socket_path: Path of the daemon unix socket.
+    :param filter_pattern: Regular expression selecting extensions.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall((filter_pattern + '\n').encode())
+        client.shutdown(socket.SHUT_WR)
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            sys.stdout.write(data.decode())
+    finally:
+        client.close()
+
+
+def update_objects_cache(objects_dir, url, rev, extension_name):
+    """Fetch ``rev`` of ``url`` into the shared bare objects repository.
+
+    Object data accumulated in ``objects_dir`` is shared on disk by
+    every clone passing ``--reference-if-able``, so extensions deriving
+    from common upstreams are not re-downloaded. The fetch is
+    best-effort: clones fall back to the network for whatever is
+    missing.
+
+    :param objects_dir: Directory of the shared bare repository.
+    :param url: URL of the git repository.
+    :param rev: Branch, tag or commit to fetch.
+    :param extension_name: Name of the extension, used for the
+        tracking ref.
+    """
+    with objects_init_lock:
+        if not os.path.exists(objects_dir):
+            subprocess.run(
+                ['git', 'init', '--quiet', '--bare', objects_dir],
+                check=True)
+    subprocess.run(
+        ['git', '-C', objects_dir, 'fetch', '--no-tags', url,
+         '%s:refs/ext/%s' % (rev, extension_name)])
+
+
+def git_fast_clone(url, rev, repo_dir, reference_dir=None):
+    """Checkout ``rev`` of git repository ``url`` into ``repo_dir``.
+
+    Invokes git directly with a shallow partial clone
+    (``--filter=blob:none --depth 1``) so only the blobs of the pinned
+    revision are transferred. When ``rev`` is not a branch or tag name,
+    falls back to fetching the revision into an empty repository and
+    checking out ``FETCH_HEAD``. Existing checkouts are updated with a
+    shallow fetch.
+
+    :param url: URL of the git repository.
+    :param rev: Branch, tag or commit to checkout.
+    :param repo_dir: Directory of the source checkout.
+    :param reference_dir: Local repository to borrow objects from.
+    """
+    if os.path.exists(os.path.join(repo_dir, '.git')):
+        subprocess.run(
+            ['git', '-C', repo_dir, 'fetch',
+             '--filter=blob:none', '--depth', '1', 'origin', rev],
+            check=True)
+        subprocess.run(
+            ['git', '-C', repo_dir, 'checkout', '--force', 'FETCH_HEAD'],
+            check=True)
+        return
+    clone_cmd = ['git', 'clone', '--filter=blob:none', '--depth', '1',
+                 '--single-branch', '--branch', rev]
+    if reference_dir is not None:
+        clone_cmd += ['--reference-if-able', reference_dir]
+    clone = subprocess.run(clone_cmd + [url, repo_dir])
+    if clone.returncode == 0:
+        return
+    if os.path.exists(repo_dir):
+        shutil.rmtree(repo_dir)
+    subprocess.run(['git', 'init', '--quiet', repo_dir], check=True)
+    if reference_dir is not None:
+        alternates_file_path = os.path.join(
+            repo_dir, '.git', 'objects', 'info', 'alternates')
+        with open(alternates_file_path, 'w') as alternates_file:
+            alternates_file.write(
+                os.path.join(reference_dir, 'objects') + '\n')
+    subprocess.run(
+        ['git', '-C', repo_dir, 'remote', 'add', 'origin', url], check=True)
+    subprocess.run(
+        ['git', '-C', repo_dir, 'fetch',
+         '--filter=blob:none', '--depth', '1', 'origin', rev],
+        check=True)
+    subprocess.run(
+        ['git', '-C', repo_dir, 'checkout', '--force', 'FETCH_HEAD'],
+        check=True)
+
+
+def repo_info_logger(extension_name, scm):
+    """Return a callable logging messages under the extension name.
+
+    Mimics the per-repo format installed by :func:`setup_logger` for
+    checkouts that bypass or cannot use the libvcs repo logger.
+    """
+    def info(message):
+        log.info("[%s] (%s) %s" % (extension_name, scm, message))
+    return info
+
+
+def libvcs_kwargs(metadata, shallow=False):
+    """Return the extra keyword arguments for ``create_repo``."""
+    kwargs = {}
+    for param_name in ['username', 'password']:
+        if 'svn' + param_name in metadata:
+            kwargs['svn_' + param_name] = metadata['svn' + param_name]
+    if shallow and metadata['scm'] == 'git':
+        kwargs['git_shallow'] = True
+    return kwargs
+
+
+def fast_git_checkout(extension_name, metadata, checkout_dir,
+                      objects_dir=None):
+    """Return the ``(info, checkout)`` pair invoking git directly.
+
+    See :func:`git_fast_clone` and :func:`update_objects_cache`.
+    """
+    def checkout():
+        if objects_dir is not None:
+            update_objects_cache(
+                objects_dir, metadata['scmurl'],
+                metadata['scmrevision'], extension_name)
+        git_fast_clone(
+            metadata['scmurl'], metadata['scmrevision'], checkout_dir,
+            reference_dir=objects_dir)
+    return repo_info_logger(extension_name, 'git'), checkout
+
+
+def libvcs_checkout(extension_name, metadata, checkout_dir,
+                    shallow=False, repo_cache=None, named_logging=False):
+    """Return the ``(info, checkout)`` pair going through libvcs.
+
+    Reuses a repo object from ``repo_cache`` when one exists. With
+    ``named_logging``, log output is attributed to the extension
+    instead of the repo directory name — the directory is the sha256
+    cache key when the clone cache is active.
+    """
+    repo = None
+    if repo_cache is not None:
+        with repo_cache_lock:
+            repo = repo_cache.get(extension_name)
+    if repo is None:
+        repo = create_repo(
+            url=metadata['scmurl'],
+            vcs=metadata['scm'],
+            rev=metadata['scmrevision'],
+            repo_dir=checkout_dir,
+            **libvcs_kwargs(metadata, shallow=shallow))
+        repo.progress_callback = progress_callback
+        if repo_cache is not None:
+            with repo_cache_lock:
+                repo_cache[extension_name] = repo
+    info = repo.info
+    if named_logging:
+        info = repo_info_logger(extension_name, metadata['scm'])
+    return info, repo.update_repo
+
+
+def clone_cache_checkout(metadata, checkout_dir, repo_dir, update_repo):
+    """Wrap ``update_repo`` to populate the clone cache entry.
+
+    The entry at ``checkout_dir`` is checked out at most once and then
+    hardlinked into ``repo_dir``.
+    """
+    def cached_checkout():
+        with clone_cache_lock(clone_cache_key(metadata)):
+            if not os.path.exists(checkout_dir):
+                update_repo()
+        if not os.path.exists(repo_dir):
+            shutil.copytree(checkout_dir, repo_dir,
+                            copy_function=os.link)
+    return cached_checkout
+
+
+def prepare_checkout(extension_name, metadata, repo_dir, checkout_dir,
+                     shallow=False, fast_git=False, objects_dir=None,
+                     repo_cache=None):
+    """Select the checkout strategy for a single extension.
+
+    Chooses between invoking git directly (``fast_git``) and going
+    through libvcs; when ``checkout_dir`` differs from ``repo_dir`` the
+    checkout populates the clone cache entry and hardlinks it into
+    place.
+
+    :param extension_name: Name of the extension.
+    :param metadata: Dictionary of extension metadata.
+    :param repo_dir: Directory of the extension source checkout.
+    :param checkout_dir: Directory the scm tool writes to (the clone
+        cache entry when caching is active, ``repo_dir`` otherwise).
+    :param shallow: If True, clone git repositories with ``--depth 1``.
+    :param fast_git: If True, checkout git extensions by invoking git
+        directly with a shallow partial clone instead of libvcs.
+    :param objects_dir: Shared bare repository accumulating git objects
+        referenced by every fast-git clone.
+    :param repo_cache: Dictionary caching libvcs repo objects across
+        the refreshes of a daemon run.
+    :return: Tuple of logging callable and checkout callable.
+    """
+    caching = checkout_dir != repo_dir
+    if fast_git and metadata['scm'] == 'git':
+        info, checkout = fast_git_checkout(
+            extension_name, metadata, checkout_dir,
+            objects_dir=objects_dir)
+    else:
+        info, checkout = libvcs_checkout(
+            extension_name, metadata, checkout_dir, shallow=shallow,
+            repo_cache=repo_cache, named_logging=caching)
+    if caching:
+        checkout = clone_cache_checkout(
+            metadata, checkout_dir, repo_dir, checkout)
+    return info, checkout
+
+
+def checkout_extension(extension_name, metadata, extensions_source_dir,
+                       stats, only_missing=False, shallow=False,
+                       delete_future=None, clone_cache_dir=None,
+                       fast_git=False, objects_dir=None, repo_cache=None):
+    """Checkout or update the source checkout of a single extension.
+
+    :param extension_name: Name of the extension.
+    :param metadata: Dictionary of extension metadata.
+    :param extensions_source_dir: Directory containing the source checkouts.
+    :param stats: Dictionary of already collected checkout times.
+    :param only_missing: If True, skip extensions with an already
+        collected checkout time.
+    :param shallow: If True, clone git repositories with ``--depth 1``.
+    :param delete_future: Future deleting the previous source checkout,
+        awaited before the checkout starts.
+    :param clone_cache_dir: Directory caching clones by source revision.
+        If set, each unique ``(scmurl, scmrevision)`` pair is checked
+        out once and hardlinked into the extension source directory.
+    :param fast_git: If True, checkout git extensions by invoking git
+        directly with a shallow partial clone instead of libvcs.
+    :param objects_dir: Shared bare repository accumulating git objects
+        referenced by every fast-git clone.
+    :param repo_cache: Dictionary caching libvcs repo objects across
+        the refreshes of a daemon run.
+    :return: Tuple of extension name, checkout duration and a boolean
+        indicating if the checkout time was already collected. Duration
+        is None if the extension was skipped.
+    """
+    if delete_future is not None:
+        delete_future.result()
+    with stats_lock:
+        elapsed_time_collected = extension_name in stats
+    if only_missing and elapsed_time_collected:
+        return extension_name, None, elapsed_time_collected
+    repo_dir = os.path.join(extensions_source_dir, extension_name)
+    checkout_dir = repo_dir
+    if clone_cache_dir is not None:
+        checkout_dir = os.path.join(
+            clone_cache_dir, clone_cache_key(metadata))
+    info, checkout = prepare_checkout(
+        extension_name, metadata, repo_dir, checkout_dir,
+        shallow=shallow, fast_git=fast_git, objects_dir=objects_dir,
+        repo_cache=repo_cache)
+    info("Begin timed call")
+    duration, result = time_call(checkout)()
+    flush_progress_buffer()
+    info("Elapsed time: {:.2f}s\n".format(duration))
+    return extension_name, duration, elapsed_time_collected
+
+
+def scan_extensions_index(extensions_index_dir, file_filter):
+    """Return ``(name, metadata)`` tuples for matching description files.
+
+    :param extensions_index_dir: Directory containing ``.s4ext`` files.
+    :param file_filter: Regular expression selecting extension names.
+    """
+    re_file_match = re.compile(file_filter)
+    with os.scandir(extensions_index_dir) as dir_entries:
+        return [
+            (entry.name[:-len(S4EXT_SUFFIX)], parse_s4ext(entry.path))
+            for entry in dir_entries
+            if entry.name.endswith(S4EXT_SUFFIX)
+            and re_file_match.match(entry.name[:-len(S4EXT_SUFFIX)])
+        ]
+
+
+def schedule_deletions(extensions, extensions_source_dir, stats, jobs):
+    """Schedule deletions of previous source checkouts.
+
+    Deletions run on a dedicated pool so each checkout can wait only on
+    its own deletion without deadlocking the checkout workers.
+
+    :param extensions: List of ``(name, metadata)`` tuples.
+    :param extensions_source_dir: Directory containing the source checkouts.
+    :param stats: Dictionary of already collected checkout times.
+    :param jobs: Number of deletions to run in parallel.
+    :return: Tuple of the executor owning the deletions and a dictionary
+        of futures indexed by extension name.
+    """
+    delete_executor = ThreadPoolExecutor(max_workers=jobs)
+    delete_futures = {}
+    for extension_name, _ in extensions:
+        extension_source_dir = \
+            os.path.join(extensions_source_dir, extension_name)
+        if os.path.exists(extension_source_dir):
+            log.warning("Deleting %s" % extension_source_dir)
+            stats.pop(extension_name, None)
+            delete_futures[extension_name] = \
+                delete_executor.submit(shutil.rmtree, extension_source_dir)
+    return delete_executor, delete_futures
+
+
+def finish_delete_only_run(delete_executor, delete_futures,
+                           stats_file_path, stats):
+    """Wait for scheduled deletions and persist the pruned stats.
+
+    A delete-only run never calls create_repo or update_repo.
+    """
+    if delete_futures:
+        wait(delete_futures.values())
+    if delete_executor is not None:
+        delete_executor.shutdown()
+    write_dict(stats_file_path, stats)
+
+
+def setup_cache_dirs(args, extensions_source_dir):
+    """Return the clone cache and shared objects directories.
+
+    Either is None when the corresponding flag is not in effect;
+    --shared-objects additionally requires --fast-git since libvcs
+    offers no way to pass the reference repository.
+    """
+    clone_cache_dir = None
+    if args.clone_cache:
+        clone_cache_dir = os.path.join(extensions_source_dir, ".cache")
+        os.makedirs(clone_cache_dir, exist_ok=True)
+    objects_dir = None
+    if args.shared_objects:
+        if args.fast_git:
+            objects_dir = os.path.join(extensions_source_dir, ".objects")
+        else:
+            log.warning("Ignoring --shared-objects: requires --fast-git")
+    return clone_cache_dir, objects_dir
+
+
+def select_executor_class(args, delete_futures):
+    """Return the executor class for the requested dispatch mode."""
+    if args.daemon and args.executor != "threads":
+        # Repo objects can only be reused across refreshes by threads.
+        log.warning("Ignoring --executor %s: daemon mode uses threads"
+                    % args.executor)
+        args.executor = "threads"
+    if args.executor == "processes":
+        # Futures do not cross process boundaries: complete all
+        # deletions before dispatching to worker processes.
+        if delete_futures:
+            wait(delete_futures.values())
+            delete_futures.clear()
+        return ProcessPoolExecutor
+    return ThreadPoolExecutor
+
+
+def record_result(result, completed, stats, stats_file_path,
+                  checkpoint_every):
+    """Merge a completed checkout into ``stats``."""
+    extension_name, duration, elapsed_time_collected = result
+    with stats_lock:
+        if not elapsed_time_collected:
+            stats[extension_name] = duration
+        if checkpoint_every and completed % checkpoint_every == 0:
+            write_dict(stats_file_path, stats)
+
+
+def run_checkouts(selected_extensions, executor_class, args,
+                  extensions_source_dir, stats, stats_file_path,
+                  delete_futures, clone_cache_dir, objects_dir,
+                  repo_cache=None):
+    """Checkout ``selected_extensions`` and return their results."""
+    results = []
+    with executor_class(max_workers=args.jobs) as executor:
+        futures = [
+            executor.submit(
+                checkout_extension, extension_name, metadata,
+                extensions_source_dir,
+                stats, only_missing=args.only_missing,
+                shallow=args.shallow,
+                delete_future=delete_futures.get(extension_name),
+                clone_cache_dir=clone_cache_dir,
+                fast_git=args.fast_git,
+                objects_dir=objects_dir,
+                repo_cache=repo_cache)
+            for extension_name, metadata in selected_extensions
+        ]
+        for completed, future in enumerate(
+                as_completed(futures), start=1):
+            result = future.result()
+            record_result(result, completed, stats, stats_file_path,
+                          args.checkpoint_every)
+            results.append(result)
+    return results
+
+
+async def checkout_all(extensions, args, extensions_source_dir, stats,
+                       stats_file_path, delete_futures, clone_cache_dir,
+                       objects_dir):
+    """Checkout ``extensions`` as asyncio tasks bounded by a semaphore."""
+    semaphore = asyncio.Semaphore(args.jobs)
+
+    async def checkout_one(extension_name, metadata):
+        async with semaphore:
+            return await asyncio.to_thread(
+                checkout_extension, extension_name, metadata,
+                extensions_source_dir,
+                stats, only_missing=args.only_missing,
+                shallow=args.shallow,
+                delete_future=delete_futures.get(extension_name),
+                clone_cache_dir=clone_cache_dir,
+                fast_git=args.fast_git,
+                objects_dir=objects_dir)
+
+    tasks = [
+        asyncio.ensure_future(checkout_one(extension_name, metadata))
+        for extension_name, metadata in extensions
+    ]
+    for completed, task in enumerate(
+            asyncio.as_completed(tasks), start=1):
+        record_result(await task, completed, stats, stats_file_path,
+                      args.checkpoint_every)
+
+
+def make_refresh_handler(extensions, executor_class, args,
+                         extensions_source_dir, stats, stats_file_path,
+                         delete_futures, clone_cache_dir, objects_dir,
+                         repo_cache):
+    """Return the callable servicing one daemon refresh request."""
+    def handle_refresh(filter_pattern):
+        re_refresh = re.compile(filter_pattern)
+        selected_extensions = [
+            (extension_name, metadata)
+            for extension_name, metadata in extensions
+            if re_refresh.match(extension_name)
+        ]
+        results = run_checkouts(
+            selected_extensions, executor_class, args,
+            extensions_source_dir, stats, stats_file_path,
+            delete_futures, clone_cache_dir, objects_dir,
+            repo_cache=repo_cache)
+        write_dict(stats_file_path, stats)
+        return [
+            (extension_name, duration)
+            for extension_name, duration, _ in results
+            if duration is not None
+        ]
+    return handle_refresh
+
+
+def build_parser():
+    """Return the command-line argument parser."""
     parser = argparse.ArgumentParser(
         description='Checkout and update Slicer extension sources.')
     parser.add_argument(
@@ -117,9 +761,64 @@ def main():
         default=".*", type=str,
         help="Regular expression to select particular \
         extensions (e.g 'ABC|Slicer.+')")
+    parser.add_argument(
+        "--clone-cache", dest='clone_cache', action="store_true",
+        help="Checkout each unique source revision once under \
+        '.cache' and hardlink it into the extension source directories.")
     parser.add_argument(
         "--delete", action="store_true",
         help="Delete previous source checkout.")
+    parser.add_argument(
+        "--checkpoint-every", dest='checkpoint_every',
+        default=0, type=int,
+        help="Persist checkout times every N completed extensions \
+        (default: only at exit).")
+    parser.add_argument(
+        "--shared-objects", dest='shared_objects', action="store_true",
+        help="Accumulate git objects in a bare '.objects' repository \
+        referenced by every clone, so extensions sharing upstream \
+        history are not re-downloaded. Requires --fast-git.")
+    parser.add_argument(
+        "--shallow", action="store_true",
+        help="Clone git repositories with '--depth 1' to only \
+        download the history needed for the pinned revision.")
+    parser.add_argument(
+        "--executor",
+        default="threads", choices=["threads", "processes", "asyncio"],
+        help="Dispatch checkouts to worker threads, worker processes or \
+        asyncio tasks. Processes sidestep the GIL for the python-level \
+        parsing and bookkeeping done around each checkout; asyncio \
+        bounds concurrency with a semaphore without per-worker \
+        interpreters.")
+    parser.add_argument(
+        "--fast-git", dest='fast_git', action="store_true",
+        help="Checkout git extensions by invoking git directly with a \
+        shallow partial clone (--filter=blob:none --depth 1). \
+        Other scm types still go through libvcs.")
+    parser.add_argument(
+        "--jobs",
+        default=min(16, (os.cpu_count() or 1) * 2), type=int,
+        help="Number of extensions to checkout in parallel.")
+    parser.add_argument(
+        "--no-update", dest='no_update', action="store_true",
+        help="Do not checkout or update extension sources. \
+        Useful to only delete previous source checkouts.")
+    parser.add_argument(
+        "--only-missing", dest='only_missing', action="store_true",
+        help="Only checkout extensions without an already \
+        collected checkout time.")
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="Run as a long-lived daemon servicing refresh requests \
+        over a unix socket, reusing repo objects across refreshes.")
+    parser.add_argument(
+        "--refresh", metavar="FILTER",
+        help="Ask a running daemon to refresh extensions matching \
+        FILTER ('stop' shuts the daemon down) and exit.")
+    parser.add_argument(
+        "--socket", dest='socket_path', default=None,
+        help="Path of the daemon unix socket \
+        (default: '<ExtensionsSource>/.pys4ext.sock').")
     parser.add_argument(
         '--log-level', dest='log_level',
         default='INFO',
@@ -128,7 +827,12 @@ def main():
 
     parser.add_argument("/path/to/ExtensionsIndex")
     parser.add_argument("/path/to/ExtensionsSource")
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    """Execute command-line tool."""
+    args = build_parser().parse_args()
 
     def get_path_arg(arg_key):
         """Read command line argument ``arg_key`` as an absolute path."""
@@ -137,54 +841,62 @@ def main():
     extensions_index_dir = get_path_arg("/path/to/ExtensionsIndex")
 
     setup_logger(logger=log, level=args.log_level.upper())
+    setup_git_config()
+
+    socket_path = args.socket_path or \
+        os.path.join(extensions_source_dir, ".pys4ext.sock")
+    if args.refresh is not None:
+        request_refresh(socket_path, args.refresh)
+        return
 
     log.info("extensions_source_dir is [%s]" % extensions_source_dir)
     log.info("extensions_index_dir is [%s]" % extensions_index_dir)
 
-    file_match = "*.s4ext"
-
     stats_file_name = "ExtensionsCheckoutTimes.json"
 
     stats_file_path = os.path.join(extensions_source_dir, stats_file_name)
     stats = read_dict(stats_file_path)
 
-    re_file_match = re.compile(args.filter)
-    for file_path in glob.glob(os.path.join(extensions_index_dir, file_match)):
-        extension_name = os.path.splitext(os.path.basename(file_path))[0]
-        if not re_file_match.match(extension_name):
-            continue
-        metadata = parse_s4ext(file_path)
-        log_context = {'repo_name': extension_name, 'repo_vcs': metadata['scm']}
-        if args.delete:
-            extension_source_dir = \
-                os.path.join(extensions_source_dir, extension_name)
-            if os.path.exists(extension_source_dir):
-                log.warning("Deleting %s" % extension_source_dir,
-                            extra=log_context)
-                if extension_name in stats:
-                    del stats[extension_name]
-                    write_dict(stats_file_path, stats)
-                shutil.rmtree(extension_source_dir)
-        elapsed_time_collected = False
-        if extension_name in stats:
-            elapsed_time_collected = True
-        kwargs = {}
-        for param_name in ['username', 'password']:
-            if 'svn' + param_name in metadata:
-                kwargs['svn_' + param_name] = metadata['svn' + param_name]
-        repo = create_repo(
-            url=metadata['scmurl'],
-            vcs=metadata['scm'],
-            rev=metadata['scmrevision'],
-            repo_dir=os.path.join(extensions_source_dir, extension_name),
-            **kwargs)
-        repo.progress_callback = progress_callback
-        repo.info("Begin timed call")
-        duration, result = time_call(repo.update_repo)()
-        repo.info("Elapsed time: {:.2f}s\n".format(duration))
-        if not elapsed_time_collected:
-            stats[extension_name] = duration
-
+    clone_cache_dir, objects_dir = \
+        setup_cache_dirs(args, extensions_source_dir)
+
+    extensions = scan_extensions_index(extensions_index_dir, args.filter)
+
+    warm_dns_cache(metadata for _, metadata in extensions)
+
+    delete_futures = {}
+    delete_executor = None
+    if args.delete:
+        delete_executor, delete_futures = schedule_deletions(
+            extensions, extensions_source_dir, stats, args.jobs)
+
+    if args.no_update:
+        finish_delete_only_run(
+            delete_executor, delete_futures, stats_file_path, stats)
+        return
+
+    executor_class = select_executor_class(args, delete_futures)
+    repo_cache = {} if args.daemon else None
+
+    try:
+        if args.daemon:
+            serve_daemon(socket_path, make_refresh_handler(
+                extensions, executor_class, args, extensions_source_dir,
+                stats, stats_file_path, delete_futures, clone_cache_dir,
+                objects_dir, repo_cache))
+        elif args.executor == "asyncio":
+            asyncio.run(checkout_all(
+                extensions, args, extensions_source_dir, stats,
+                stats_file_path, delete_futures, clone_cache_dir,
+                objects_dir))
+        else:
+            run_checkouts(
+                extensions, executor_class, args, extensions_source_dir,
+                stats, stats_file_path, delete_futures, clone_cache_dir,
+                objects_dir)
+    finally:
+        if delete_executor is not None:
+            delete_executor.shutdown()
         write_dict(stats_file_path, stats)
 
 